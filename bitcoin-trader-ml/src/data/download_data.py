@@ -12,10 +12,20 @@ DATA_DIR = "data/raw"
 START_DATE = date.today() - timedelta(days = 500)
 END_DATE = date.today()
 
+def load_existing_data(file_path):
+    """
+    Loads a previously downloaded CSV, keeping yfinance's (Price, Ticker)
+    column header so new rows can be appended to it directly.
+    """
+    if not os.path.exists(file_path):
+        return None
+    return pd.read_csv(file_path, header=[0, 1], index_col=0, parse_dates=True)
+
 def download_btc_data():
     """
     Downloads historical hourly data for Bitcoin using yfinance
-    and saves it to a CSV file.
+    and saves it to a CSV file. If the file already exists, only bars
+    after its last timestamp are fetched and appended.
     """
     print(f"--- Starting {INTERVAL} Data Download for {TICKER} ---")
 
@@ -23,21 +33,38 @@ def download_btc_data():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
+    file_path = os.path.join(DATA_DIR, f"{TICKER}.csv")
+    existing = load_existing_data(file_path)
+
+    start = pd.Timestamp(START_DATE, tz='UTC')
+    if existing is not None and not existing.empty:
+        # Resume after the last stored bar, but never earlier than START_DATE
+        start = max(start, existing.index.max() + pd.Timedelta(INTERVAL))
+    end = pd.Timestamp(END_DATE, tz='UTC')
+
+    if start >= end:
+        print(f"{file_path} is already up to date.")
+        print("--- Data Download Complete ---")
+        return
+
     try:
-        print(f"Fetching data from {START_DATE} to {END_DATE}...")
+        print(f"Fetching data from {start} to {end}...")
         df = yf.download(
             tickers=TICKER,
-            start=START_DATE,
-            end=END_DATE,
-            interval=INTERVAL
+            start=start,
+            end=end,
+            interval=INTERVAL,
+            threads=True
         )
 
         if not df.empty:
-            file_path = os.path.join(DATA_DIR, f"{TICKER}.csv")
+            if existing is not None:
+                df = pd.concat([existing, df])
+                df = df[~df.index.duplicated(keep='last')].sort_index()
             df.to_csv(file_path)
             print(f"Successfully saved {len(df)} rows of data to {file_path}")
         else:
-            print(f"No data returned for {TICKER}.")
+            print(f"No new data returned for {TICKER}.")
 
     except Exception as e:
         print(f"Could not fetch data for {TICKER}: {e}")
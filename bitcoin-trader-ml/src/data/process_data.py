@@ -1,82 +1,205 @@
 import os
-import pandas as pd
-import pandas_ta as ta
+import numpy as np
+import polars as pl
+import talib
+from joblib import Memory
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Numba is optional: without it the JIT decorator is a no-op and the
+# fallback labeler runs as plain Python.
+try:
+    from numba import njit, prange
+except ImportError:
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+__all__ = ['process_btc_data']
 
 # --- Configuration ---
 TICKER = "BTC-USD"
 RAW_DATA_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
+CACHE_DIR = "data/cache"
 
 # --- Labeling Configuration (for hourly data) ---
 FORWARD_WINDOW = 24  # Look forward 24 hours
 PROFIT_TARGET = 0.02  # 2% profit target
 STOP_LOSS = 0.01  # 1% stop-loss
 
-def process_btc_data():
+# Above this size the (bars x FORWARD_WINDOW) look-ahead matrix is not
+# materialised and labels are computed by the JIT-compiled loop instead.
+MAX_LABEL_MATRIX_BYTES = 512 * 1024 ** 2
+
+# Base indicators are memoized on disk, keyed by the raw CSV contents
+memory = Memory(CACHE_DIR, verbose=0)
+
+@njit(cache=True, parallel=True)
+def _triple_barrier(close, window, pt, sl):
     """
-    Loads raw hourly data, calculates base features, creates lagged features,
-    creates a target label, and saves the processed data.
+    Loop-based triple-barrier labeling, one bar per thread. Returns a label
+    for each of the first len(close) - window bars.
     """
-    print(f"--- Starting Data Processing for {TICKER} ---")
+    n = max(len(close) - window, 0)
+    target = np.zeros(n, dtype=np.int8)
+    for i in prange(n):
+        profit_price = close[i] * (1 + pt)
+        loss_price = close[i] * (1 - sl)
+        for j in range(1, window + 1):
+            future_price = close[i + j]
+            if future_price >= profit_price:
+                target[i] = 1
+                break
+            if future_price <= loss_price:
+                break
+    return target
 
-    if not os.path.exists(PROCESSED_DIR):
-        os.makedirs(PROCESSED_DIR)
+def _triple_barrier_vectorized(close, window, pt, sl):
+    """
+    Vectorized equivalent of _triple_barrier using a sliding window view.
+    """
+    n = len(close) - window
+    if n <= 0:
+        # Too short for a full look-ahead window; nothing can be labeled
+        return np.zeros(max(n, 0), dtype=np.int8)
 
-    file_path = os.path.join(RAW_DATA_DIR, f"{TICKER}.csv")
-    if not os.path.exists(file_path):
-        print(f"Error: Raw data file not found at {file_path}")
-        return
+    # Each row of `future` holds the `window` closes following that bar.
+    future = sliding_window_view(close[1:], window)
+    entry = close[:-window, None]
+    profit_hit = future >= entry * (1 + pt)
+    loss_hit = future <= entry * (1 - sl)
+
+    # Index of the first bar that crosses each barrier (`window` if never)
+    profit_idx = np.where(profit_hit.any(axis=1), profit_hit.argmax(axis=1), window)
+    loss_idx = np.where(loss_hit.any(axis=1), loss_hit.argmax(axis=1), window)
+    return (profit_idx < loss_idx).astype(np.int8)
 
-    # --- THIS IS THE CORRECTED LINE ---
-    # It now includes skiprows=[1] to skip the junk "Ticker" row.
-    df = pd.read_csv(file_path, header=0, index_col=0, skiprows=[1], parse_dates=True)
-    df.index.name = 'Date'
+def _load_indicators(raw_bytes):
+    """
+    Parses the raw CSV contents and calculates the base indicators. The
+    result depends only on its argument and this function's source, so it
+    is safe to memoize on disk.
+    """
+    # The scan skips the junk "Ticker" and "Datetime" rows under the header;
+    # the CSV is parsed by Polars' multithreaded reader in one pass.
+    df = (
+        pl.scan_csv(raw_bytes, skip_rows_after_header=2, try_parse_dates=True)
+        .rename({'Price': 'Date'})
+        .collect()
+    )
     print(f"Loaded {len(df)} rows of raw data.")
 
     # --- 1. Feature Engineering - Base Indicators ---
     print("Calculating base indicators...")
-    df.ta.sma(length=20, append=True)
-    df.ta.sma(length=100, append=True)
-    df.ta.rsi(length=14, append=True)
-    df.ta.macd(append=True)
-    df.ta.bbands(length=20, append=True)
-    df.ta.atr(length=14, append=True)
-    df.ta.adx(length=14, append=True)
-    df.ta.obv(append=True)
+    # TA-Lib works on contiguous float64 buffers; column names follow the
+    # pandas_ta convention that train_model.py selects features by.
+    close = df['Close'].cast(pl.Float64).to_numpy()
+    high = df['High'].cast(pl.Float64).to_numpy()
+    low = df['Low'].cast(pl.Float64).to_numpy()
+    volume = df['Volume'].cast(pl.Float64).to_numpy()
+
+    macd, macd_signal, macd_hist = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
+    bb_upper, bb_mid, bb_lower = talib.BBANDS(close, timeperiod=20, nbdevup=2.0, nbdevdn=2.0)
+    indicators = {
+        'SMA_20': talib.SMA(close, timeperiod=20),
+        'SMA_100': talib.SMA(close, timeperiod=100),
+        'RSI_14': talib.RSI(close, timeperiod=14),
+        'MACD_12_26_9': macd,
+        'MACDh_12_26_9': macd_hist,
+        'MACDs_12_26_9': macd_signal,
+        'BBL_20_2.0': bb_lower,
+        'BBM_20_2.0': bb_mid,
+        'BBU_20_2.0': bb_upper,
+        'BBB_20_2.0': 100 * (bb_upper - bb_lower) / bb_mid,
+        'BBP_20_2.0': (close - bb_lower) / (bb_upper - bb_lower),
+        'ATRr_14': talib.ATR(high, low, close, timeperiod=14),
+        'ADX_14': talib.ADX(high, low, close, timeperiod=14),
+        'DMP_14': talib.PLUS_DI(high, low, close, timeperiod=14),
+        'DMN_14': talib.MINUS_DI(high, low, close, timeperiod=14),
+        'OBV': talib.OBV(close, volume),
+    }
+    # TA-Lib pads its warm-up period with NaN; store it as null so it is dropped below
+    return df.with_columns(
+        pl.Series(name, values, nan_to_null=True) for name, values in indicators.items()
+    )
+
+# joblib keys its cache by module name, which is "__main__" under
+# `python -m src.data.process_data`; use the import path so script runs and
+# imports share one cache entry.
+if __name__ == '__main__' and __spec__ is not None:
+    _load_indicators.__module__ = __spec__.name
+_load_indicators = memory.cache(_load_indicators)
+
+def _build_features(raw_bytes):
+    """
+    Calculates indicators, lagged features and target labels from the raw
+    CSV contents. Only the indicators come from the on-disk cache; lags and
+    labels are recomputed on every run so configuration changes take effect.
+    """
+    df = _load_indicators(raw_bytes)
+    close = df['Close'].cast(pl.Float64).to_numpy()
 
     # --- 2. Feature Engineering - Lagged Features ---
     print("Creating lagged features...")
     indicators_to_lag = ['RSI_14', 'MACDh_12_26_9', 'BBP_20_2.0', 'OBV']
     lag_periods = [1, 3, 6, 12]
 
-    for indicator in indicators_to_lag:
-        for lag in lag_periods:
-            df[f'{indicator}_lag_{lag}'] = df[indicator].shift(lag)
+    # All lag columns go into a single with_columns so Polars evaluates them in parallel
+    lf = df.lazy().with_columns(
+        pl.col(indicator).shift(lag).alias(f'{indicator}_lag_{lag}')
+        for indicator in indicators_to_lag
+        for lag in lag_periods
+    )
 
     # --- 3. Labeling ---
     print("Creating target labels...")
-    df['target'] = 0
-    for i in range(len(df) - FORWARD_WINDOW):
-        entry_price = df['Close'].iloc[i]
-        profit_price = entry_price * (1 + PROFIT_TARGET)
-        loss_price = entry_price * (1 - STOP_LOSS)
-
-        for j in range(1, FORWARD_WINDOW + 1):
-            future_price = df['Close'].iloc[i + j]
-            if future_price >= profit_price:
-                df.at[df.index[i], 'target'] = 1
-                break
-            if future_price <= loss_price:
-                break
+    matrix_bytes = (len(close) - FORWARD_WINDOW) * FORWARD_WINDOW * close.itemsize
+    if matrix_bytes <= MAX_LABEL_MATRIX_BYTES:
+        labels = _triple_barrier_vectorized(close, FORWARD_WINDOW, PROFIT_TARGET, STOP_LOSS)
+    else:
+        labels = _triple_barrier(close, FORWARD_WINDOW, PROFIT_TARGET, STOP_LOSS)
+
+    # The last FORWARD_WINDOW bars have no full look-ahead and stay labeled 0
+    target = np.zeros(len(close), dtype=np.int8)
+    target[:len(labels)] = labels
+    lf = lf.with_columns(pl.Series('target', target))
+
+    # --- 4. Clean ---
+    return lf.drop_nulls().collect(engine="streaming")
+
+def process_btc_data():
+    """
+    Loads raw hourly data, calculates base features, creates lagged features,
+    creates a target label, and saves the processed data.
+
+    Returns the processed DataFrame so callers can use it without re-reading
+    the saved file, or None if the raw data is missing.
+    """
+    print(f"--- Starting Data Processing for {TICKER} ---")
+
+    if not os.path.exists(PROCESSED_DIR):
+        os.makedirs(PROCESSED_DIR)
+
+    file_path = os.path.join(RAW_DATA_DIR, f"{TICKER}.csv")
+    if not os.path.exists(file_path):
+        print(f"Error: Raw data file not found at {file_path}")
+        return
 
-    # --- 4. Clean and Save ---
-    df.dropna(inplace=True)
+    with open(file_path, 'rb') as f:
+        raw_bytes = f.read()
+    df = _build_features(raw_bytes)
     print(f"Data cleaned. Final dataset has {len(df)} rows.")
 
-    processed_file_path = os.path.join(PROCESSED_DIR, f"{TICKER}_processed.csv")
-    df.to_csv(processed_file_path)
+    # --- 5. Save ---
+    # Parquet keeps column types, so the training script needs no date or float parsing
+    processed_file_path = os.path.join(PROCESSED_DIR, f"{TICKER}_processed.parquet")
+    df.write_parquet(processed_file_path, compression='zstd')
     print(f"Successfully processed and saved data to {processed_file_path}")
     print("--- Data Processing Complete ---")
+    return df
 
 if __name__ == '__main__':
     process_btc_data()
\ No newline at end of file
@@ -1,11 +1,11 @@
 import os
 import pandas as pd
-import joblib
 import numpy as np # Import numpy
-from sklearn.model_selection import train_test_split
-from xgboost import XGBClassifier
-from sklearn.metrics import classification_report
-from imblearn.over_sampling import SMOTE
+from joblib import Parallel, delayed
+from sklearn.model_selection import TimeSeriesSplit, train_test_split
+import xgboost as xgb
+from xgboost.core import XGBoostError
+from sklearn.metrics import accuracy_score, classification_report
 import matplotlib.pyplot as plt
 
 #### THIS SHIT IS BROKE, BUG FIX IN GOOGLE COLLABS####
@@ -15,6 +15,95 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
 PROCESSED_DIR = os.path.join(PROJECT_ROOT, "data", "processed")
 MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
 TICKER = "BTC-USD"
+CV_FOLDS = 5
+# Time-ordered tail of each training set held back for early stopping
+VALIDATION_SIZE = 0.2
+
+# Train on the GPU when one is visible; cupy is optional and only used for detection
+try:
+    import cupy
+    USE_CUDA = cupy.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    USE_CUDA = False
+
+def build_params(device, scale_pos_weight=1.0):
+    """
+    Returns the booster parameters for training on the given device ("cuda" or "cpu").
+    """
+    return {
+        'objective': 'binary:logistic',
+        'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'device': device,
+        'max_depth': 6,
+        'scale_pos_weight': scale_pos_weight,
+        'seed': 42,
+    }
+
+def fit_model(dtrain, dval, scale_pos_weight=1.0):
+    """
+    Trains a booster on the GPU if available, falling back to the CPU
+    when CUDA is visible but fails to initialise at fit time. Early stopping
+    watches `dval`, which must not be the set the model is evaluated on.
+    """
+    device = "cuda" if USE_CUDA else "cpu"
+    print(f"Training on device: {device}")
+    train_kwargs = dict(
+        num_boost_round=200,
+        evals=[(dval, 'val')],
+        early_stopping_rounds=20,
+        verbose_eval=False,
+    )
+    try:
+        return xgb.train(build_params(device, scale_pos_weight), dtrain, **train_kwargs)
+    except XGBoostError as e:
+        if device != "cuda":
+            raise
+        print(f"GPU training failed ({e}), falling back to CPU...")
+        return xgb.train(build_params("cpu", scale_pos_weight), dtrain, **train_kwargs)
+
+def _fit_fold(X, y, train_idx, val_idx, nthread):
+    """
+    Trains one cross-validation fold on the CPU and returns its validation
+    accuracy. Early stopping watches the tail of the fold's training block,
+    so the validation block is only used for scoring.
+    """
+    fit_idx, stop_idx = train_test_split(train_idx, test_size=VALIDATION_SIZE, shuffle=False)
+    y_fit = y.iloc[fit_idx]
+    scale_pos_weight = (y_fit == 0).sum() / max((y_fit == 1).sum(), 1)
+    params = build_params("cpu", scale_pos_weight)
+    params['nthread'] = nthread
+
+    dtrain = xgb.QuantileDMatrix(X.iloc[fit_idx], label=y_fit, max_bin=256)
+    dstop = xgb.QuantileDMatrix(X.iloc[stop_idx], label=y.iloc[stop_idx], ref=dtrain)
+    dval = xgb.QuantileDMatrix(X.iloc[val_idx], ref=dtrain)
+    booster = xgb.train(
+        params, dtrain, num_boost_round=200,
+        evals=[(dstop, 'stop')], early_stopping_rounds=20, verbose_eval=False,
+    )
+    probabilities = booster.predict(dval, iteration_range=(0, booster.best_iteration + 1))
+    return accuracy_score(y.iloc[val_idx], probabilities > 0.5)
+
+def cross_validate(X, y, n_splits=CV_FOLDS):
+    """
+    Scores the model with walk-forward TimeSeriesSplit folds, fitted in
+    parallel. Each fold gets an equal share of the cores, since a single
+    fit stops scaling well past a handful of threads.
+    """
+    nthread = max((os.cpu_count() or 1) // n_splits, 1)
+    splits = TimeSeriesSplit(n_splits=n_splits).split(X)
+    return Parallel(n_jobs=n_splits, backend='loky')(
+        delayed(_fit_fold)(X, y, train_idx, val_idx, nthread)
+        for train_idx, val_idx in splits
+    )
+
+def load_model(model_path):
+    """
+    Loads a booster saved by train_model().
+    """
+    booster = xgb.Booster()
+    booster.load_model(model_path)
+    return booster
 
 def train_model():
     """
@@ -23,13 +112,13 @@ def train_model():
     print(f"--- Starting Model Training for {TICKER} (Debug Mode) ---")
 
     # --- 1. Load Data ---
-    file_path = os.path.join(PROCESSED_DIR, f"{TICKER}_processed.csv")
-    df = pd.read_csv(file_path, index_col='Date', parse_dates=True)
+    file_path = os.path.join(PROCESSED_DIR, f"{TICKER}_processed.parquet")
+    df = pd.read_parquet(file_path, engine='pyarrow').set_index('Date')
 
     # --- EXTRA DATA SANITIZATION ---
-    # Replace any infinite values with NaN and then drop those rows
-    df.replace([np.inf, -np.inf], np.nan, inplace=True)
-    df.dropna(inplace=True)
+    # Drop rows with any infinite or NaN value; np.isfinite catches both in one pass
+    finite_rows = np.isfinite(df.select_dtypes('number').to_numpy()).all(axis=1)
+    df = df.loc[finite_rows]
     print(f"Loaded and sanitized {len(df)} rows of processed data.")
 
     # --- 2. Define Features (X) and Target (y) ---
@@ -38,44 +127,67 @@ def train_model():
     macd_cols = [col for col in df.columns if 'MACD' in col]
     lag_cols = [col for col in df.columns if 'lag' in col]
     feature_cols = ['SMA_20', 'SMA_100', 'RSI_14', 'ATRr_14', 'OBV'] + adx_cols + bbands_cols + macd_cols + lag_cols
+    # Lag columns such as 'BBP_20_2.0_lag_1' match several filters; keep each column once
+    feature_cols = list(dict.fromkeys(feature_cols))
 
-    X = df[feature_cols]
-    y = df['target']
+    # XGBoost bins features internally as float32, so float64 only doubles memory traffic
+    X = df[feature_cols].astype(np.float32)
+    y = df['target'].astype(np.int8)
 
     # --- 3. Split Data ---
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, shuffle=False
     )
 
-    # --- 4. Apply SMOTE ---
-    print("\nApplying SMOTE to balance the training data...")
-    smote = SMOTE(random_state=42)
-    X_train_resampled, y_train_resampled = smote.fit_resample(X_train, y_train)
+    # --- 4. Balance Classes ---
+    # Weight the positive class by the negative/positive ratio instead of
+    # synthesising minority samples, which costs nothing before the fit.
+    scale_pos_weight = (y_train == 0).sum() / max((y_train == 1).sum(), 1)
+    print(f"\nUsing scale_pos_weight={scale_pos_weight:.2f} to balance the training data...")
 
-    # --- 5. Train a SINGLE XGBoost Model (No GridSearchCV) ---
-    print("\nAttempting to train a single XGBClassifier...")
-    model = XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='logloss')
+    # --- 5. Cross-Validate ---
+    # Folds only see the training split; shuffled folds would leak future bars.
+    print(f"\nRunning {CV_FOLDS}-fold time-series cross-validation...")
+    scores = cross_validate(X_train, y_train)
+    print(f"CV accuracy per fold: {', '.join(f'{score:.3f}' for score in scores)}")
+    print(f"Mean CV accuracy: {np.mean(scores):.3f} (+/- {np.std(scores):.3f})")
+
+    # --- 6. Train the Final XGBoost Model ---
+    print("\nAttempting to train the final XGBoost booster...")
+    # Early stopping watches the last VALIDATION_SIZE of the training split,
+    # so the test split stays untouched until the final report.
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=VALIDATION_SIZE, shuffle=False
+    )
+    # Features are quantized into bins once; the other matrices reuse the
+    # training bin edges via ref= so all splits are binned identically.
+    dtrain = xgb.QuantileDMatrix(X_fit, label=y_fit, max_bin=256)
+    dval = xgb.QuantileDMatrix(X_val, label=y_val, ref=dtrain)
+    dtest = xgb.QuantileDMatrix(X_test, label=y_test, ref=dtrain)
 
     try:
-        model.fit(X_train_resampled, y_train_resampled)
-        print("Model training complete.")
+        model = fit_model(dtrain, dval, scale_pos_weight)
+        print(f"Model training complete (best iteration: {model.best_iteration}).")
     except Exception as e:
         print("\n--- ERROR DURING FIT ---")
-        print("The core .fit() method failed. This confirms a deep incompatibility.")
+        print("The core xgb.train() call failed. This confirms a deep incompatibility.")
         print(f"Error details: {e}")
         return # Exit the function
 
-    # --- 6. Evaluate the Model ---
+    # --- 7. Evaluate the Model ---
     print("\n--- Model Evaluation ---")
-    predictions = model.predict(X_test)
+    probabilities = model.predict(dtest, iteration_range=(0, model.best_iteration + 1))
+    predictions = (probabilities > 0.5).astype(np.int8)
     report = classification_report(y_test, predictions)
     print(report)
 
-    # --- 7. Save the Model ---
+    # --- 8. Save the Model ---
     if not os.path.exists(MODEL_DIR):
         os.makedirs(MODEL_DIR)
-    model_path = os.path.join(MODEL_DIR, "bitcoin_trader_model_xgb_debug.pkl")
-    joblib.dump(model, model_path)
+    # XGBoost's native binary format is smaller than a pickle and loads across
+    # library versions; only the trees up to the early-stopping point are kept.
+    model_path = os.path.join(MODEL_DIR, "bitcoin_trader_model_xgb_debug.ubj")
+    model[: model.best_iteration + 1].save_model(model_path)
     print(f"\nModel saved successfully to {model_path}")
 
 if __name__ == '__main__':